@@ -1,17 +1,46 @@
-# pylint: disable=too-many-instance-attributes
-import re
+# pylint: disable=too-many-instance-attributes,too-many-arguments,redefined-builtin
+# pylint: disable=too-many-positional-arguments,too-few-public-methods
+import array
+import sys
 import typing
-from dataclasses import dataclass
 
-class VideoID:
-    __slots__ = ('value',)
+_B64_CHARS: typing.Final = b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-"
+_CHANNEL_TABS: typing.Final = ("videos", "streams", "shorts")
+_TAG_CHARS: typing.Final = _B64_CHARS + b"./"
+
+_YT_URL: typing.Final = "https://www.youtube.com/"
+_YT_WATCH_URL: typing.Final = "https://www.youtube.com/watch?v="
+_YT_PLAYLIST_URL: typing.Final = "https://www.youtube.com/playlist?list="
+_YT_CHANNEL_URL: typing.Final = "https://www.youtube.com/channel/"
+
+def _is_b64(value: str) -> bool:
+    # Deletes every valid character in one C-level pass; anything left over is invalid
+    return value.isascii() and not value.encode("ascii").translate(None, _B64_CHARS)
+
+class VideoID: # pylint: disable=attribute-defined-outside-init,access-member-before-definition
+    __slots__ = ('value', '_hash', '_folder', '_url')
+    _folder: str
+    _url: str
     def __eq__(self, other: object) -> bool:
-        if not isinstance(other, VideoID):
+        # VideoID is never subclassed, so an identity check on the type is enough
+        if type(other) is not VideoID: # pylint: disable=unidiomatic-typecheck
             return NotImplemented
         return self.value == other.value
     @property
     def url(self) -> str:
-        return f"https://www.youtube.com/watch?v={self.value}"
+        try:
+            return self._url
+        except AttributeError:
+            self._url = _YT_WATCH_URL + self.value
+            return self._url
+    @property
+    def foldername(self) -> str:
+        # Built on first use, most IDs loaded from the database never touch the filesystem
+        try:
+            return self._folder
+        except AttributeError:
+            self._folder = f"{ord(self.value[0])-32}/{ord(self.value[1])-32}"
+            return self._folder
     def __str__(self) -> str:
         return self.value
     def __repr__(self) -> str:
@@ -19,20 +48,28 @@ class VideoID:
     def __init__(self, value: str | None) -> None:
         if value is None:
             raise ValueError("Value does not exist")
-        if re.match(r"^[a-zA-Z0-9_-]{11}$",value) is None:
+        if len(value) != 11 or not _is_b64(value):
             raise ValueError(f"Error: Invalid VideoID {value}")
         self.value = value
-    def __hash__(self) -> str:
-        return hash(self.value)
+        self._hash = hash(value)
+    def __hash__(self) -> int:
+        return self._hash
 
-class PlaylistID:
-    __slots__ = ('value',)
+class PlaylistID: # pylint: disable=attribute-defined-outside-init,access-member-before-definition
+    __slots__ = ('value', '_url')
+    _url: str
     @property
     def url(self) -> str:
+        try:
+            return self._url
+        except AttributeError:
+            pass
         if self.value[0] == "$":
             v = self.value[1:].split(".")
-            return f"https://www.youtube.com/channel/{v[0]}/{v[1]}"
-        return f"https://www.youtube.com/playlist?list={self.value}"
+            self._url = "".join((_YT_CHANNEL_URL, v[0], "/", v[1]))
+        else:
+            self._url = _YT_PLAYLIST_URL + self.value
+        return self._url
     def __str__(self) -> str:
         return self.value
     def __repr__(self) -> str:
@@ -40,12 +77,18 @@ class PlaylistID:
     def __init__(self, value: str | None) -> None:
         if value is None:
             raise ValueError("Value does not exist")
-        if re.match(
-            r"^\$UC[a-zA-Z0-9_-]{22}\.(videos|streams|shorts)|"
-            r"PL[a-zA-Z0-9_-]{32}|"
-            r"PL[a-zA-Z0-9_-]{16}|"
-            r"FL[a-zA-Z0-9_-]{22}$"
-        ,value) is None:
+        # Every accepted form has a fixed prefix and length, so dispatch on those
+        # and only run the character check on the remaining body
+        length = len(value)
+        if value.startswith("$UC") and length > 26 and value[25] == ".":
+            valid = _is_b64(value[3:25]) and value[26:] in _CHANNEL_TABS
+        elif value.startswith("PL") and length in (18, 34):
+            valid = _is_b64(value[2:])
+        elif value.startswith("FL") and length == 24:
+            valid = _is_b64(value[2:])
+        else:
+            valid = False
+        if not valid:
             raise ValueError(f"Error: Invalid PlaylistID {value}")
         self.value = value
 
@@ -53,10 +96,10 @@ class ChannelHandle:
     __slots__ = ('value',)
     @property
     def url(self) -> str:
-        return f"https://www.youtube.com/{self.value}"
+        return _YT_URL + self.value
     @property
     def about_url(self) -> str:
-        return f"https://www.youtube.com/{self.value}/about"
+        return "".join((_YT_URL, self.value, "/about"))
     def __str__(self) -> str:
         return self.value
     def __repr__(self) -> str:
@@ -64,9 +107,9 @@ class ChannelHandle:
     def __init__(self, value: str | None) -> None:
         if value is None:
             raise ValueError("Value does not exist")
-        if re.match(r"^@.*$",value) is None:
+        if len(value) < 2 or value[0] != "@":
             raise ValueError(f"Error: Invalid ChannelHandle {value}")
-        self.value = value
+        self.value = sys.intern(value)
 
 class TagID:
     __slots__ = ('value',)
@@ -77,145 +120,224 @@ class TagID:
     def __init__(self, value: str | None) -> None:
         if value is None:
             raise ValueError("Value does not exist")
-        if re.match(r"^([a-zA-Z0-9-_.]+/)*[a-zA-Z0-9-_.]+$",value) is None:
+        # Slash-separated path of non-empty segments, checked without a backtracking regex
+        if (
+            not value or value[0] == "/" or value[-1] == "/" or "//" in value
+            or not value.isascii() or value.encode("ascii").translate(None, _TAG_CHARS)
+        ):
             raise ValueError(f"Error: Invalid TagID {value}")
         self.value = value
 
-class ChannelUUID:
-    __slots__ = ('value',)
+class ChannelUUID: # pylint: disable=attribute-defined-outside-init,access-member-before-definition
+    __slots__ = ('value', '_url')
+    _url: str
     @property
     def playlists_url(self) -> str:
-        return f"https://www.youtube.com/channel/{self.value}/playlists"
+        return "".join((_YT_CHANNEL_URL, self.value, "/playlists"))
     @property
     def about_url(self) -> str:
-        return f"https://www.youtube.com/channel/{self.value}/about"
+        return "".join((_YT_CHANNEL_URL, self.value, "/about"))
     @property
     def url(self) -> str:
-        return f"https://www.youtube.com/channel/{self.value}"
+        try:
+            return self._url
+        except AttributeError:
+            self._url = _YT_CHANNEL_URL + self.value
+            return self._url
     def __str__(self) -> str:
         return self.value
     def __repr__(self) -> str:
         return f"ChannelUUID<{self.value}>"
     def __init__(self, value: str) -> None:
-        if re.match(r"^UC[a-zA-Z0-9_-]{22}$",value) is None:
+        if len(value) != 24 or not value.startswith("UC") or not _is_b64(value[2:]):
             raise ValueError(f"Error: Invalid ChannelUUID {value}")
-        self.value = value
-
-class VideoNumID:
-    __slots__ = ('value',)
-    def __str__(self) -> str:
-        return f"{self.value}"
-    def __int__(self) -> int:
-        return self.value
-    def __repr__(self) -> str:
-        return f"VideoNumID<{self.value}>"
-    def __init__(self, value: int) -> None:
-        self.value = value
-
-class PlaylistNumID:
-    __slots__ = ('value',)
-    def __str__(self) -> str:
-        return f"{self.value}"
-    def __int__(self) -> int:
-        return self.value
-    def __repr__(self) -> str:
-        return f"PlaylistNumID<{self.value}>"
-    def __init__(self, value: int) -> None:
-        self.value = value
+        self.value = sys.intern(value)
 
-class ChannelNumID:
-    __slots__ = ('value',)
-    def __str__(self) -> str:
-        return f"{self.value}"
-    def __int__(self) -> int:
-        return self.value
-    def __repr__(self) -> str:
-        return f"ChannelNumID<{self.value}>"
-    def __init__(self, value: int) -> None:
-        self.value = value
+VideoNumID = typing.NewType('VideoNumID', int)
+PlaylistNumID = typing.NewType('PlaylistNumID', int)
+ChannelNumID = typing.NewType('ChannelNumID', int)
+TagNumID = typing.NewType('TagNumID', int)
 
-class TagNumID:
-    __slots__ = ('value',)
-    def __str__(self) -> str:
-        return f"{self.value}"
-    def __int__(self) -> int:
-        return self.value
-    def __repr__(self) -> str:
-        return f"TagNumID<{self.value}>"
-    def __init__(self, value: int) -> None:
-        self.value = value
+_SIZE_UNITS: typing.Final = ("B", "KiB", "MiB", "GiB", "TiB")
 
 def convert_file_size(size: int) -> str:
     size=int(size)
     if size < 2**10:
-        return f"{size           } B"
-    if size < 2**20:
-        return f"{size/(2**10):.02f} KiB"
-    if size < 2**30:
-        return f"{size/(2**20):.02f} MiB"
-    if size < 2**40:
-        return f"{size/(2**30):.02f} GiB"
-    return f"{size/(2**40):.02f} TiB"
-
-@dataclass(slots=True)
+        return f"{size} B"
+    # bit_length()-1 is floor(log2(size)), so every 10 bits is one unit step
+    unit = min((size.bit_length()-1)//10, len(_SIZE_UNITS)-1)
+    return f"{size/(1 << (unit*10)):.02f} {_SIZE_UNITS[unit]}"
+
+_VIDEO_STRING_FMT: typing.Final = "%s | %d:%02d:%02d | %s (%s): %s"
+
 class VideoMetadata:
+    __slots__ = (
+        'id', 'title', 'description', 'upload_timestamp', 'duration', 'epoch',
+        'channel_id', 'channel_handle', 'channel_name'
+    )
     def to_string(self) -> str:
-        def convert_duration(dur: int) -> str:
-            return f"{int(dur/3600)}:{int(dur/60)%60:02d}:{dur%60:02d}"
-        return (
-            f"{self.id} | "
-            f"{convert_duration(self.duration)} | "
-            f"{self.channel_name} ({self.channel_handle}): "
-            f"{self.title}"
+        hours, rem = divmod(self.duration, 3600)
+        minutes, seconds = divmod(rem, 60)
+        return _VIDEO_STRING_FMT % (
+            self.id, hours, minutes, seconds,
+            self.channel_name, self.channel_handle, self.title
+        )
+    def __init__(
+        self,
+        id: VideoID,
+        title: str,
+        description: str,
+        upload_timestamp: int,
+        duration: int,
+        epoch: int,
+        channel_id: ChannelUUID,
+        channel_handle: ChannelHandle,
+        channel_name: str
+    ) -> None:
+        self.id = id
+        self.title = title
+        self.description = description
+        self.upload_timestamp = upload_timestamp
+        self.duration = duration
+        self.epoch = epoch
+        self.channel_id = channel_id
+        self.channel_handle = channel_handle
+        # The same few channel names repeat across every video in a listing.
+        # yt-dlp can leave the name out, and sys.intern only accepts str
+        self.channel_name = (
+            sys.intern(channel_name) if isinstance(channel_name, str) else channel_name
         )
 
-    id: VideoID
+class VideoRow(typing.NamedTuple):
+    id: str
     title: str
     description: str
     upload_timestamp: int
     duration: int
     epoch: int
-    channel_id: ChannelUUID
-    channel_handle: ChannelHandle
+    channel_id: str
+    channel_handle: str
     channel_name: str
 
+# Column-oriented store for large video listings, integer columns are packed arrays
+class VideoTable:
+    __slots__ = (
+        'ids', 'titles', 'descriptions', 'upload_timestamps', 'durations', 'epochs',
+        'channel_ids', 'channel_handles', 'channel_names'
+    )
+    def __len__(self) -> int:
+        return len(self.ids)
+    def extend_rows(self, rows: typing.Iterable[tuple[typing.Any, ...]]) -> None:
+        # Rows are in VideoRow order, which is also the order of __slots__
+        for column, values in zip(self.__slots__, zip(*rows)):
+            getattr(self, column).extend(values)
+    def append(self, video: VideoMetadata) -> None:
+        self.ids.append(video.id.value)
+        self.titles.append(video.title)
+        self.descriptions.append(video.description)
+        self.upload_timestamps.append(video.upload_timestamp)
+        self.durations.append(video.duration)
+        self.epochs.append(video.epoch)
+        self.channel_ids.append(video.channel_id.value)
+        self.channel_handles.append(video.channel_handle.value)
+        self.channel_names.append(video.channel_name)
+    def iter_rows(self) -> typing.Iterator[VideoRow]:
+        return map(VideoRow._make, zip(
+            self.ids, self.titles, self.descriptions,
+            self.upload_timestamps, self.durations, self.epochs,
+            self.channel_ids, self.channel_handles, self.channel_names
+        ))
+    def get(self, index: int) -> VideoMetadata:
+        return VideoMetadata(
+            id=VideoID(self.ids[index]),
+            title=self.titles[index],
+            description=self.descriptions[index],
+            upload_timestamp=self.upload_timestamps[index],
+            duration=self.durations[index],
+            epoch=self.epochs[index],
+            channel_id=ChannelUUID(self.channel_ids[index]),
+            channel_handle=ChannelHandle(self.channel_handles[index]),
+            channel_name=self.channel_names[index]
+        )
+    def __init__(self) -> None:
+        self.ids: list[str] = []
+        self.titles: list[str] = []
+        self.descriptions: list[str] = []
+        self.upload_timestamps = array.array('q')
+        self.durations = array.array('q')
+        self.epochs = array.array('q')
+        self.channel_ids: list[str] = []
+        self.channel_handles: list[str] = []
+        self.channel_names: list[str] = []
+
 PlaylistEntriesT=typing.TypeVar('PlaylistEntriesT')
-@dataclass(slots=True)
 class PlaylistMetadata(typing.Generic[PlaylistEntriesT]):
+    __slots__ = (
+        'id', 'title', 'description', 'channel_id', 'channel_handle', 'channel_name',
+        'epoch', 'entries'
+    )
     @property
     def entry_count(self) -> int:
-        match self.entries:
-            case int(): return self.entries
-            case list(): return len(self.entries)
-            case _: raise NotImplementedError(type(self.entries))
+        entries = self.entries
+        entries_type = type(entries)
+        if entries_type is int:
+            return typing.cast(int, entries)
+        if entries_type is list:
+            return len(typing.cast(list[typing.Any], entries))
+        raise NotImplementedError(entries_type)
 
     def to_string(self) -> str:
+        count = self.entry_count
         return (
             f"{self.id} | "
-            f"{self.entry_count} video{"s" if self.entry_count > 1 else ""} | "
+            f"{count} video{"s" if count > 1 else ""} | "
             f"{self.channel_name} ({self.channel_handle}): "
             f"{self.title}"
         )
+    def __init__(
+        self,
+        id: PlaylistID,
+        title: str,
+        description: str,
+        channel_id: ChannelUUID,
+        channel_handle: ChannelHandle,
+        channel_name: str,
+        epoch: int,
+        entries: PlaylistEntriesT
+    ) -> None:
+        self.id = id
+        self.title = title
+        self.description = description
+        self.channel_id = channel_id
+        self.channel_handle = channel_handle
+        self.channel_name = channel_name
+        self.epoch = epoch
+        self.entries = entries
 
-    id: PlaylistID
-    title: str
-    description: str
-    channel_id: ChannelUUID
-    channel_handle: ChannelHandle
-    channel_name: str
-    epoch: int
-    entries: PlaylistEntriesT
-
-@dataclass(slots=True)
 class ChannelMetadata:
-    id: ChannelUUID
-    handle: ChannelHandle
-    title: str
-    description: str
-    epoch: int
+    __slots__ = ('id', 'handle', 'title', 'description', 'epoch')
+    def __init__(
+        self,
+        id: ChannelUUID,
+        handle: ChannelHandle,
+        title: str,
+        description: str,
+        epoch: int
+    ) -> None:
+        self.id = id
+        self.handle = handle
+        self.title = title
+        self.description = description
+        self.epoch = epoch
 
-@dataclass(slots=True)
 class TagMetadata:
-    num_id: TagNumID
-    id: TagID
-    long_name: str
+    __slots__ = ('num_id', 'id', 'long_name')
+    def __init__(
+        self,
+        num_id: TagNumID,
+        id: TagID,
+        long_name: str
+    ) -> None:
+        self.num_id = num_id
+        self.id = id
+        self.long_name = long_name
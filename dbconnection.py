@@ -2,482 +2,697 @@
 
 import sqlite3
 import re
+import contextlib
+import functools
+import json
 import time
-from typing import Any, cast
+from typing import Any, Callable, Iterator, cast
 import sys
+import zlib
+from collections import OrderedDict
 
 from datatypes import VideoID, PlaylistID, ChannelUUID, TagID, ChannelHandle
 from datatypes import VideoNumID, PlaylistNumID, ChannelNumID, TagNumID
-from datatypes import VideoMetadata, PlaylistMetadata, ChannelMetadata, TagMetadata
+from datatypes import VideoMetadata, PlaylistMetadata, ChannelMetadata, TagMetadata, VideoTable
+
+STATEMENT_CACHE_SIZE = 128
+NUMID_CACHE_SIZE = 4096
+
+_WHITESPACE_RE = re.compile(r'[\n\t ]+')
+
+@functools.lru_cache(maxsize=256)
+def _normalize_sql(sql: str) -> str:
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+@functools.lru_cache(maxsize=256)
+def _command_ref(command: str) -> str:
+    return f"{command.split(" ", 1)[0]}:{zlib.crc32(command.encode()) & 0xff}"
+
+def _lru_put(cache: OrderedDict[str, Any], key: str, value: Any) -> None:
+    cache[key] = value
+    if len(cache) > NUMID_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def _noop(*_args: Any) -> None:
+    pass
+
+for _id_type in (VideoID, PlaylistID, ChannelHandle, ChannelUUID, TagID):
+    sqlite3.register_adapter(_id_type, str)
+
+_SQL_WRITE_LOG = _normalize_sql("INSERT INTO Log(ts,category,content) VALUES (?,?,?)")
+_SQL_GET_VIDEO_INFO = _normalize_sql('''
+    SELECT
+        Video.id,Video.title,Video.description,Video.upload_timestamp,
+        Video.duration,Video.epoch,Channel.id,Channel.handle,Channel.title
+    FROM Video
+    INNER JOIN Channel ON Video.channel_id=Channel.num_id
+    WHERE Video.id=?
+''')
+_SQL_WRITE_VIDEO_INFO = _normalize_sql('''
+    INSERT INTO Video(id,title,description,upload_timestamp,duration,epoch,channel_id)
+    VALUES (?,?,?,?,?,?,?)
+    ON CONFLICT DO UPDATE SET
+        title=excluded.title,
+        description=excluded.description,
+        upload_timestamp=excluded.upload_timestamp,
+        duration=excluded.duration,
+        epoch=excluded.epoch,
+        channel_id=excluded.channel_id
+    RETURNING (num_id)
+''')
+_SQL_TAG_VIDEO_DEFAULT = _normalize_sql(
+    "INSERT OR REPLACE INTO TaggedVideo(tag_id,video_id) VALUES (0,?)"
+)
+# One row per entry, a single row with NULL entries for an empty playlist
+_SQL_GET_PLAYLIST_INFO = _normalize_sql('''
+    SELECT
+        Playlist.id, Playlist.title, Playlist.description, Playlist.epoch,
+        Channel.id, Channel.handle, Channel.title,
+        Video.id, Video.title, Video.description,
+        Video.upload_timestamp, Video.duration, Video.epoch,
+        VideoChannel.id, VideoChannel.handle, VideoChannel.title
+    FROM Playlist
+    INNER JOIN Channel ON Playlist.channel_id=Channel.num_id
+    LEFT JOIN Pointer ON Pointer.playlist_id=Playlist.num_id
+    LEFT JOIN Video ON Video.num_id=Pointer.video_id
+    LEFT JOIN Channel AS VideoChannel ON Video.channel_id=VideoChannel.num_id
+    WHERE Playlist.id=?
+    ORDER BY Pointer.position ASC
+''')
+_SQL_WRITE_PLAYLIST_INFO = _normalize_sql('''
+    INSERT INTO Playlist(id,title,description,epoch,count,channel_id)
+    VALUES (?,?,?,?,?,?)
+    ON CONFLICT DO UPDATE SET
+        title=excluded.title,
+        description=excluded.description,
+        epoch=excluded.epoch,
+        count=excluded.count,
+        channel_id=excluded.channel_id
+    RETURNING (num_id)
+''')
+_SQL_TRIM_POINTERS = _normalize_sql('''
+    DELETE FROM Pointer
+    WHERE playlist_id=? AND video_id NOT IN (SELECT value FROM json_each(?))
+''')
+_SQL_UPSERT_POINTER = _normalize_sql('''
+    INSERT INTO Pointer(playlist_id, video_id, position) VALUES (?,?,?)
+    ON CONFLICT(playlist_id, video_id) DO UPDATE SET
+        position=excluded.position
+    WHERE position!=excluded.position
+''')
+_SQL_TAG_PLAYLIST_DEFAULT = _normalize_sql(
+    "INSERT OR REPLACE INTO TaggedPlaylist(tag_id,playlist_id) VALUES (0,?)"
+)
+_SQL_GET_CHANNEL_BY_ID = _normalize_sql('''
+    SELECT
+        id, handle, title, description, epoch
+    FROM Channel
+    WHERE id=?
+''')
+_SQL_GET_CHANNEL_BY_HANDLE = _normalize_sql('''
+    SELECT
+        id, handle, title, description, epoch
+    FROM Channel
+    WHERE handle=?
+''')
+_SQL_WRITE_CHANNEL_INFO = _normalize_sql('''
+    INSERT INTO Channel(id,handle,title,description,epoch) VALUES (?,?,?,?,?)
+    ON CONFLICT DO UPDATE SET
+        handle=excluded.handle,
+        title=excluded.title,
+        description=excluded.description,
+        epoch=excluded.epoch
+    RETURNING num_id, id
+''')
+_SQL_GET_VIDEOS = _normalize_sql('''
+    SELECT
+        Video.id, Video.title, Video.description, Video.upload_timestamp,
+        Video.duration, Video.epoch, Channel.id, Channel.handle, Channel.title
+    FROM Video
+    INNER JOIN Channel ON Video.channel_id=Channel.num_id
+''')
+_SQL_GET_PLAYLISTS = _normalize_sql('''
+    SELECT
+        Playlist.id, Playlist.title, Playlist.description,
+        Playlist.count, Playlist.epoch,
+        Channel.id, Channel.title, Channel.handle
+    FROM Playlist
+    INNER JOIN Channel ON Playlist.channel_id=Channel.num_id
+''')
+# Tags are bound as one JSON array
+_SQL_GET_VIDEOS_TAGGED = _normalize_sql(_SQL_GET_VIDEOS + '''
+    JOIN (
+        SELECT video_id
+        FROM TaggedVideo
+        WHERE tag_id IN (SELECT value FROM json_each(?))
+        GROUP BY video_id
+        HAVING COUNT(*) = ?
+    ) AS tagged ON Video.num_id = tagged.video_id
+''')
+_SQL_GET_PLAYLISTS_TAGGED = _normalize_sql(_SQL_GET_PLAYLISTS + '''
+    JOIN (
+        SELECT playlist_id
+        FROM TaggedPlaylist
+        WHERE tag_id IN (SELECT value FROM json_each(?))
+        GROUP BY playlist_id
+        HAVING COUNT(*) = ?
+    ) AS tagged ON Playlist.num_id = tagged.playlist_id
+''')
+_SQL_GET_VIDEO_PLAYLISTS = _normalize_sql('''
+    SELECT Pointer.playlist_id, Pointer.position FROM Video
+    JOIN Pointer ON Pointer.video_id=Video.num_id WHERE Video.id=?
+''')
+_SQL_GET_VIDEOS_FROM_CHANNEL = _normalize_sql(_SQL_GET_VIDEOS + " WHERE Channel.id=?")
+_SQL_GET_PLAYLISTS_FROM_CHANNEL = _normalize_sql(_SQL_GET_PLAYLISTS + " WHERE Channel.id=?")
+_SQL_GET_VNUMID = _normalize_sql("SELECT num_id FROM Video WHERE id=?")
+_SQL_GET_VNUMIDS = _normalize_sql(
+    "SELECT id, num_id FROM Video WHERE id IN (SELECT value FROM json_each(?))"
+)
+_SQL_GET_CNUMID = _normalize_sql("SELECT num_id FROM Channel WHERE id=?")
+_SQL_GET_PNUMID = _normalize_sql("SELECT num_id FROM Playlist WHERE id=?")
+_SQL_GET_TNUMID = _normalize_sql("SELECT num_id FROM Tag WHERE id=?")
+_SQL_CREATE_TAG = _normalize_sql(
+    "INSERT INTO Tag(id,description) VALUES (?,?) RETURNING (num_id)"
+)
+_SQL_DELETE_TAG = _normalize_sql("DELETE FROM Tag WHERE id=?")
+_SQL_GET_TAG_INFO = _normalize_sql("SELECT num_id,id,long_name FROM Tag WHERE id=?")
+_SQL_TAG_VIDEO = _normalize_sql(
+    "INSERT OR REPLACE INTO TaggedVideo(tag_id,video_id) VALUES (?,?)"
+)
+_SQL_TAG_PLAYLIST = _normalize_sql(
+    "INSERT OR REPLACE INTO TaggedPlaylist(tag_id,playlist_id) VALUES (?,?)"
+)
+_SQL_GET_VIDEO_TAGS = _normalize_sql('''
+    SELECT TaggedVideo.tag_id FROM Video
+    JOIN TaggedVideo ON TaggedVideo.video_id=Video.num_id WHERE Video.id=?
+''')
+_SQL_GET_PLAYLIST_TAGS = _normalize_sql('''
+    SELECT TaggedPlaylist.tag_id FROM Playlist
+    JOIN TaggedPlaylist ON TaggedPlaylist.playlist_id=Playlist.num_id WHERE Playlist.id=?
+''')
+_SQL_REMOVE_VIDEO = _normalize_sql("DELETE FROM Video WHERE id=?")
+
+_PRENORMALIZED_SQL: frozenset[str] = frozenset(
+    value for name, value in list(globals().items()) if name.startswith("_SQL_")
+)
+
+def _tag_filter_params(tnumid: list[TagNumID | None]) -> tuple[str, int]:
+    tags = sorted({x for x in tnumid if x is not None})
+    return (json.dumps(tags), len(tags))
+
+# row_factory for video queries, columns are in VideoMetadata's parameter order
+def _video_row(
+    _cursor: sqlite3.Cursor | None,
+    row: tuple[Any, ...],
+    _video: type[VideoMetadata] = VideoMetadata,
+    _vid: type[VideoID] = VideoID,
+    _cid: type[ChannelUUID] = ChannelUUID,
+    _handle: type[ChannelHandle] = ChannelHandle
+) -> VideoMetadata:
+    return _video(
+        _vid(row[0]), row[1], row[2], row[3], row[4], row[5],
+        _cid(row[6]), _handle(row[7]), row[8]
+    )
+
+# row_factory for playlist queries, entries is the stored count
+def _playlist_row(
+    _cursor: sqlite3.Cursor | None,
+    row: tuple[Any, ...],
+    _playlist: type[PlaylistMetadata[Any]] = PlaylistMetadata,
+    _pid: type[PlaylistID] = PlaylistID,
+    _cid: type[ChannelUUID] = ChannelUUID,
+    _handle: type[ChannelHandle] = ChannelHandle
+) -> PlaylistMetadata[int]:
+    return _playlist(
+        _pid(row[0]), row[1], row[2], _cid(row[5]), _handle(row[7]), row[6], row[4], row[3]
+    )
+
+# row_factory for single-column queries
+def _first_column(_cursor: sqlite3.Cursor, row: tuple[Any, ...]) -> Any:
+    return row[0]
 
 class Database:
-    def _exec(self, sql: str, params: tuple[Any, ...] | None = None) -> list[tuple[Any, ...]]:
+    def _prepare(
+        self, sql: str, params: tuple[Any, ...] | None
+    ) -> tuple[str, tuple[Any, ...]]:
         if params is None:
             params = ()
-        new_params: list[Any] = []
-        for param in params:
-            match param:
-                case str() | int():
-                    new_params.append(param)
-                case VideoNumID() | PlaylistNumID() | ChannelNumID() | TagNumID():
-                    new_params.append(int(param))
-                case VideoID() | PlaylistID() | ChannelHandle() | ChannelUUID() | TagID():
-                    new_params.append(str(param))
-                case None:
-                    new_params.append(None)
-                case _:
-                    raise NotImplementedError(f"Error: Did not expect {type(param)} | {param}")
-        params = tuple(new_params)
-        command = re.sub(r'[\n\t ]+', ' ', sql).strip()
-        cmdref=f"{command.split(" ")[0]}:{sum((ord(x)*i)&0x2a for i,x in enumerate(command))&0xff}"
-        if self.print_db_log:
-            print(f"--------------------\n[DEBUG] {cmdref} {command} \n{params=}")
+        command = sql if sql in _PRENORMALIZED_SQL else _normalize_sql(sql)
+        self._log_query(command, params)
+        return command, params
+    def _exec_rows(
+        self,
+        sql: str,
+        params: tuple[Any, ...] | None,
+        row_factory: Callable[[sqlite3.Cursor, tuple[Any, ...]], Any]
+    ) -> list[Any]:
+        command, params = self._prepare(sql, params)
+        cursor = self.connection.cursor()
+        cursor.row_factory = row_factory
         start = time.perf_counter_ns()
-        out = self.connection.execute(command, params).fetchall()
+        rows = cursor.execute(command, params).fetchall()
         end = time.perf_counter_ns()
+        self._report(command, start, end, len(rows))
+        return rows
+    def _cached_cursor(self, command: str) -> sqlite3.Cursor:
+        cursor = self._stmt_cache.get(command)
+        if cursor is None:
+            cursor = self.connection.cursor()
+            self._stmt_cache[command] = cursor
+            if len(self._stmt_cache) > STATEMENT_CACHE_SIZE:
+                self._stmt_cache.popitem(last=False)[1].close()
+        else:
+            self._stmt_cache.move_to_end(command)
+        return cursor
+    def _report(self, command: str, start: int, end: int, row_count: int) -> None:
         if end - start > 10_000_000:
-            print(f"[WARNING] Command {int((end-start)/1_000_000)} ms [{cmdref}]",file=sys.stderr)
-        if self.print_db_log:
             print(
-                f"Time took: {(end-start)/1_000_000:.2f}ms\n"
-                f"Returned {len(out)} row(s)\n"
-                f"--------------------"
+                f"[WARNING] Command {int((end-start)/1_000_000)} ms [{_command_ref(command)}]",
+                file=sys.stderr
             )
+        self._log_result(start, end, row_count)
+    def _exec(self, sql: str, params: tuple[Any, ...] | None = None) -> list[tuple[Any, ...]]:
+        command, params = self._prepare(sql, params)
+        cursor = self._cached_cursor(command)
+        start = time.perf_counter_ns()
+        out = cursor.execute(command, params).fetchall()
+        end = time.perf_counter_ns()
+        self._report(command, start, end, len(out))
         return out
+    def _exec_one(self, sql: str, params: tuple[Any, ...] | None = None) -> tuple[Any, ...] | None:
+        # Only for SELECTs on a unique key
+        command, params = self._prepare(sql, params)
+        cursor = self._cached_cursor(command)
+        start = time.perf_counter_ns()
+        row = cast(tuple[Any, ...] | None, cursor.execute(command, params).fetchone())
+        end = time.perf_counter_ns()
+        self._report(command, start, end, 0 if row is None else 1)
+        return row
+    def _exec_many(self, sql: str, rows: list[tuple[Any, ...]]) -> None:
+        command, _ = self._prepare(sql, tuple(rows))
+        cursor = self._cached_cursor(command)
+        start = time.perf_counter_ns()
+        cursor.executemany(command, rows)
+        end = time.perf_counter_ns()
+        self._report(command, start, end, len(rows))
+    @staticmethod
+    def _print_query(command: str, params: tuple[Any, ...]) -> None:
+        print(f"--------------------\n[DEBUG] {_command_ref(command)} {command} \n{params=}")
+    @staticmethod
+    def _print_result(start: int, end: int, row_count: int) -> None:
+        print(
+            f"Time took: {(end-start)/1_000_000:.2f}ms\n"
+            f"Returned {row_count} row(s)\n"
+            f"--------------------"
+        )
 
     def __init__(self, dbfname: str, print_db_log: bool):
-        self.print_db_log = print_db_log
+        self._log_query: Callable[[str, tuple[Any, ...]], None] = (
+            self._print_query if print_db_log else _noop
+        )
+        self._log_result: Callable[[int, int, int], None] = (
+            self._print_result if print_db_log else _noop
+        )
         self.db_filename = dbfname
-        self.connection = sqlite3.connect(self.db_filename)
+        self.connection = sqlite3.connect(self.db_filename, cached_statements=256)
+        self._stmt_cache: OrderedDict[str, sqlite3.Cursor] = OrderedDict()
+        self._in_tx = False
+        self._vnumid_cache: OrderedDict[str, VideoNumID] = OrderedDict()
+        self._pnumid_cache: OrderedDict[str, PlaylistNumID] = OrderedDict()
+        self._tnumid_cache: OrderedDict[str, TagNumID] = OrderedDict()
+        self._cnumid_cache: OrderedDict[str, ChannelNumID] = OrderedDict()
         try:
-            int_check = self._exec("PRAGMA integrity_check")
+            int_check = self._exec("PRAGMA quick_check")
         except sqlite3.DatabaseError as e:
             raise IOError("Invalid database") from e
-        self.connection.commit()
 
         if int_check[0][0]!='ok':
             raise IOError(f"FATAL ERROR: Database corrupt: {int_check}")
 
         self._exec("PRAGMA foreign_keys=ON")
-        self.connection.commit()
         if self._exec("PRAGMA foreign_keys")[0][0] != 1:
             raise OSError("Build of sqlite3 does not support foreign keys")
 
-        self._exec('''CREATE TABLE IF NOT EXISTS Log (
-            ts INTEGER PRIMARY KEY,
-            category TEXT NOT NULL,
-            content TEXT NOT NULL
-        ) STRICT''')
-        self._exec("CREATE INDEX IF NOT EXISTS idx_log_category ON Log(category)")
-
-        self._exec('''CREATE TABLE IF NOT EXISTS Channel (
-            num_id INTEGER PRIMARY KEY,
-            id TEXT NOT NULL UNIQUE,
-            handle TEXT NOT NULL UNIQUE,
-
-            title TEXT NOT NULL,
-            description TEXT NOT NULL,
-            epoch INTEGER NOT NULL,
-            removed INTEGER NOT NULL DEFAULT 0,
-            aux_data TEXT
-        ) STRICT''')
-        self._exec("CREATE INDEX IF NOT EXISTS idx_channel_id ON Channel(id)")
-
-        self._exec('''CREATE TABLE IF NOT EXISTS Video (
-            num_id INTEGER PRIMARY KEY,
-            id TEXT NOT NULL UNIQUE,
-
-            title TEXT NOT NULL,
-            description TEXT NOT NULL,
-            upload_timestamp INTEGER NOT NULL,
-            duration INTEGER NOT NULL,
-            epoch INTEGER NOT NULL,
+        journal_mode = self._exec("PRAGMA journal_mode=WAL")[0][0]
+        if journal_mode != "wal":
+            print(
+                f"[WARNING] Could not enable WAL, database is in {journal_mode} mode",
+                file=sys.stderr
+            )
+        self._exec("PRAGMA synchronous=NORMAL")
+        self._exec("PRAGMA temp_store=MEMORY")
+        self._exec("PRAGMA cache_size=-65536") # 64 MiB
+        self._exec("PRAGMA mmap_size=268435456") # 256 MiB
+        self._exec("PRAGMA busy_timeout=5000")
+
+        # sqlite3 does not begin a transaction for DDL
+        with self.connection:
+            self._exec("BEGIN")
+            self._exec('''CREATE TABLE IF NOT EXISTS Log (
+                ts INTEGER PRIMARY KEY,
+                category TEXT NOT NULL,
+                content TEXT NOT NULL
+            ) STRICT''')
+            self._exec("CREATE INDEX IF NOT EXISTS idx_log_category ON Log(category)")
+
+            self._exec('''CREATE TABLE IF NOT EXISTS Channel (
+                num_id INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                handle TEXT NOT NULL UNIQUE,
+
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
+                epoch INTEGER NOT NULL,
+                removed INTEGER NOT NULL DEFAULT 0,
+                aux_data TEXT
+            ) STRICT''')
+            self._exec("DROP INDEX IF EXISTS idx_channel_id")
+
+            self._exec('''CREATE TABLE IF NOT EXISTS Video (
+                num_id INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
+                upload_timestamp INTEGER NOT NULL,
+                duration INTEGER NOT NULL,
+                epoch INTEGER NOT NULL,
             
-            channel_id INTEGER NOT NULL,
-            removed INTEGER NOT NULL DEFAULT 0,
-            aux_data TEXT,
-            FOREIGN KEY (channel_id) REFERENCES Channel(num_id)      
-        ) STRICT''')
-        self._exec("CREATE INDEX IF NOT EXISTS idx_video_id ON Video(id)")
-        self._exec("CREATE INDEX IF NOT EXISTS idx_video_channel ON Video(channel_id)")
-
-        self._exec('''CREATE TABLE IF NOT EXISTS Playlist (
-            num_id INTEGER PRIMARY KEY,
-            id TEXT NOT NULL UNIQUE,
-
-            title TEXT NOT NULL,
-            description TEXT NOT NULL,
+                channel_id INTEGER NOT NULL,
+                removed INTEGER NOT NULL DEFAULT 0,
+                aux_data TEXT,
+                FOREIGN KEY (channel_id) REFERENCES Channel(num_id)      
+            ) STRICT''')
+            self._exec("DROP INDEX IF EXISTS idx_video_id")
+            self._exec("CREATE INDEX IF NOT EXISTS idx_video_channel ON Video(channel_id)")
+
+            self._exec('''CREATE TABLE IF NOT EXISTS Playlist (
+                num_id INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+
+                title TEXT NOT NULL,
+                description TEXT NOT NULL,
             
-            count INTEGER NOT NULL,
+                count INTEGER NOT NULL,
             
-            epoch INTEGER NOT NULL,
-
-            channel_id INTEGER NOT NULL,
-            removed INTEGER NOT NULL DEFAULT 0,
-            aux_data TEXT,
-            FOREIGN KEY (channel_id) REFERENCES Channel(num_id)
-        ) STRICT''')
-        self._exec("CREATE INDEX IF NOT EXISTS idx_playlist_id ON Playlist(id)")
-        self._exec("CREATE INDEX IF NOT EXISTS idx_playlist_channel ON Playlist(channel_id)")
-
-        self._exec('''CREATE TABLE IF NOT EXISTS Pointer (
-            playlist_id INTEGER NOT NULL,
-            video_id INTEGER NOT NULL,
+                epoch INTEGER NOT NULL,
+
+                channel_id INTEGER NOT NULL,
+                removed INTEGER NOT NULL DEFAULT 0,
+                aux_data TEXT,
+                FOREIGN KEY (channel_id) REFERENCES Channel(num_id)
+            ) STRICT''')
+            self._exec("DROP INDEX IF EXISTS idx_playlist_id")
+            self._exec("CREATE INDEX IF NOT EXISTS idx_playlist_channel ON Playlist(channel_id)")
+
+            # Migrate Pointer from a rowid table
+            pointer_schema = self._exec(
+                "SELECT sql FROM sqlite_master WHERE type='table' AND name='Pointer'"
+            )
+            rebuild_pointer = bool(pointer_schema) and "WITHOUT ROWID" not in pointer_schema[0][0]
+            if rebuild_pointer:
+                self._exec("ALTER TABLE Pointer RENAME TO PointerOld")
+            self._exec('''CREATE TABLE IF NOT EXISTS Pointer (
+                playlist_id INTEGER NOT NULL,
+                video_id INTEGER NOT NULL,
             
-            position INTEGER NOT NULL,
+                position INTEGER NOT NULL,
             
-            PRIMARY KEY (playlist_id, video_id),
-            FOREIGN KEY (playlist_id) REFERENCES Playlist(num_id) ON DELETE CASCADE,
-            FOREIGN KEY (video_id) REFERENCES Video(num_id) ON DELETE CASCADE
-        ) STRICT''')
-        self._exec("CREATE INDEX IF NOT EXISTS idx_pointer_playlist ON Pointer(playlist_id)")
-        self._exec("CREATE INDEX IF NOT EXISTS idx_pointer_video ON Pointer(video_id)")
-
-        self._exec('''CREATE TABLE IF NOT EXISTS Tag (
-            num_id INTEGER PRIMARY KEY,
-            id TEXT NOT NULL UNIQUE,
-            description TEXT,
-            aux_data TEXT
-        ) STRICT''')
-
-        self._exec('''CREATE TABLE IF NOT EXISTS TaggedVideo (
-            tag_id INTEGER NOT NULL,
-            video_id INTEGER NOT NULL,
+                PRIMARY KEY (playlist_id, video_id),
+                FOREIGN KEY (playlist_id) REFERENCES Playlist(num_id) ON DELETE CASCADE,
+                FOREIGN KEY (video_id) REFERENCES Video(num_id) ON DELETE CASCADE
+            ) STRICT, WITHOUT ROWID''')
+            if rebuild_pointer:
+                self._exec('''INSERT INTO Pointer(playlist_id, video_id, position)
+                    SELECT playlist_id, video_id, position FROM PointerOld''')
+                self._exec("DROP TABLE PointerOld")
+            self._exec("DROP INDEX IF EXISTS idx_pointer_playlist")
+            self._exec("CREATE INDEX IF NOT EXISTS idx_pointer_video ON Pointer(video_id)")
+            self._exec(
+                "CREATE INDEX IF NOT EXISTS idx_pointer_playlist_pos "
+                "ON Pointer(playlist_id, position, video_id)"
+            )
+
+            self._exec('''CREATE TABLE IF NOT EXISTS Tag (
+                num_id INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                description TEXT,
+                aux_data TEXT
+            ) STRICT''')
+
+            self._exec('''CREATE TABLE IF NOT EXISTS TaggedVideo (
+                tag_id INTEGER NOT NULL,
+                video_id INTEGER NOT NULL,
             
-            PRIMARY KEY (tag_id, video_id),
+                PRIMARY KEY (tag_id, video_id),
             
-            FOREIGN KEY (tag_id) REFERENCES Tag (num_id) ON DELETE CASCADE,
-            FOREIGN KEY (video_id) REFERENCES Video (num_id) ON DELETE CASCADE
-        ) STRICT''')
-        self._exec("CREATE INDEX IF NOT EXISTS idx_tag_video ON TaggedVideo(tag_id)")
-        self._exec("CREATE INDEX IF NOT EXISTS idx_tag_vid ON TaggedVideo(video_id)")
-
-        self._exec('''CREATE TABLE IF NOT EXISTS TaggedPlaylist (
-            tag_id INTEGER NOT NULL,
-            playlist_id INTEGER NOT NULL,
+                FOREIGN KEY (tag_id) REFERENCES Tag (num_id) ON DELETE CASCADE,
+                FOREIGN KEY (video_id) REFERENCES Video (num_id) ON DELETE CASCADE
+            ) STRICT''')
+            self._exec("CREATE INDEX IF NOT EXISTS idx_tag_video ON TaggedVideo(tag_id)")
+            self._exec("CREATE INDEX IF NOT EXISTS idx_tag_vid ON TaggedVideo(video_id)")
+
+            self._exec('''CREATE TABLE IF NOT EXISTS TaggedPlaylist (
+                tag_id INTEGER NOT NULL,
+                playlist_id INTEGER NOT NULL,
             
-            PRIMARY KEY (tag_id, playlist_id),
+                PRIMARY KEY (tag_id, playlist_id),
             
-            FOREIGN KEY (tag_id) REFERENCES Tag (num_id) ON DELETE CASCADE,
-            FOREIGN KEY (playlist_id) REFERENCES Playlist (num_id) ON DELETE CASCADE
-        ) STRICT''')
-        self._exec("CREATE INDEX IF NOT EXISTS idx_tag_playlist ON TaggedPlaylist(tag_id)")
-        self._exec("CREATE INDEX IF NOT EXISTS idx_tag_pid ON TaggedPlaylist(playlist_id)")
+                FOREIGN KEY (tag_id) REFERENCES Tag (num_id) ON DELETE CASCADE,
+                FOREIGN KEY (playlist_id) REFERENCES Playlist (num_id) ON DELETE CASCADE
+            ) STRICT''')
+            self._exec("CREATE INDEX IF NOT EXISTS idx_tag_playlist ON TaggedPlaylist(tag_id)")
+            self._exec("CREATE INDEX IF NOT EXISTS idx_tag_pid ON TaggedPlaylist(playlist_id)")
 
-        self._exec("INSERT OR IGNORE INTO Tag(num_id,id,description) VALUES (?,?,?)",(0,'',None))
+            self._exec(
+                "INSERT OR IGNORE INTO Tag(num_id,id,description) VALUES (?,?,?)", (0,'',None)
+            )
 
-        self.connection.commit()
+    def _commit(self) -> None:
+        if not self._in_tx:
+            self.connection.commit()
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["Database"]:
+        if self._in_tx:
+            yield self
+            return
+        self._in_tx = True
+        try:
+            with self.connection:
+                if not self.connection.in_transaction:
+                    self._exec("BEGIN")
+                yield self
+        except BaseException:
+            self._vnumid_cache.clear()
+            self._pnumid_cache.clear()
+            self._tnumid_cache.clear()
+            self._cnumid_cache.clear()
+            raise
+        finally:
+            self._in_tx = False
 
     def write_log(self, category: str, contents: str) -> None:
-        self._exec('''
-            INSERT INTO Log(ts,category,content) VALUES (?,?,?)
-        ''',(int(time.time()*1000000), category, contents))
-        self.connection.commit()
+        self._exec(_SQL_WRITE_LOG, (int(time.time()*1000000), category, contents))
+        self._commit()
 
     def get_video_info(self, vid: VideoID) -> VideoMetadata | None:
-        data = self._exec('''
-        SELECT
-            Video.id,Video.title,Video.description,Video.upload_timestamp,
-            Video.duration,Video.epoch,Channel.handle,Channel.id,Channel.title
-        FROM Video
-        INNER JOIN Channel ON Video.channel_id=Channel.num_id
-        WHERE Video.id=?
-        ''',(vid,))
-        if len(data) == 0:
+        data = self._exec_one(_SQL_GET_VIDEO_INFO, (vid,))
+        if data is None:
             return None
-        return VideoMetadata(
-            id=VideoID(data[0][0]),
-            title=data[0][1],
-            description=data[0][2],
-            upload_timestamp=int(data[0][3]),
-            duration=int(data[0][4]),
-            epoch=data[0][5],
-            channel_handle=ChannelHandle(data[0][6]),
-            channel_id=ChannelUUID(data[0][7]),
-            channel_name=data[0][8]
-        )
+        return _video_row(None, data)
     def write_video_info(self, video: VideoMetadata, add_tag: bool) -> VideoNumID:
-        db_out = self._exec('''
-        INSERT INTO Video(id,title,description,upload_timestamp,duration,epoch,channel_id)
-        VALUES (
-            ?,?,?,?,?,?,
-            (SELECT num_id FROM Channel WHERE id=?))
-        ON CONFLICT DO UPDATE SET  
-            title=excluded.title,
-            description=excluded.description,
-            upload_timestamp=excluded.upload_timestamp,
-            duration=excluded.duration,
-            epoch=excluded.epoch,
-            channel_id=excluded.channel_id
-        RETURNING (num_id)
-        ''',(video.id,
+        db_out = self._exec(_SQL_WRITE_VIDEO_INFO, (
+            video.id,
             video.title,
             video.description,
             int(video.upload_timestamp),
             int(video.duration),
             int(video.epoch),
-            video.channel_id
+            self.get_cnumid(video.channel_id)
         ))
+        vnumid = VideoNumID(db_out[0][0])
         if add_tag:
-            self._exec(
-                "INSERT OR REPLACE INTO TaggedVideo(tag_id,video_id) VALUES (0,?)",
-                (db_out[0][0],)
-            )
-        self.connection.commit()
-        return cast(VideoNumID,db_out[0][0])
+            self._exec(_SQL_TAG_VIDEO_DEFAULT, (vnumid,))
+        _lru_put(self._vnumid_cache, video.id.value, vnumid)
+        self._commit()
+        return vnumid
 
     def get_playlist_info(self, pid: PlaylistID) -> PlaylistMetadata[list[VideoMetadata]] | None:
-        data = self._exec('''
-        SELECT
-            Playlist.id, Playlist.title, Playlist.description, Playlist.epoch,
-            Channel.id, Channel.title, Channel.handle, Playlist.num_id
-        FROM Playlist
-        INNER JOIN Channel ON Playlist.channel_id=Channel.num_id
-        WHERE Playlist.id=?
-        ''',(pid,))
+        data = self._exec(_SQL_GET_PLAYLIST_INFO, (pid,))
         if len(data) == 0:
             return None
         return PlaylistMetadata[list[VideoMetadata]](
             id=PlaylistID(data[0][0]),
             title=data[0][1],
             description=data[0][2],
-            epoch=int(data[0][3]),
-            entries=[VideoMetadata(
-                id=VideoID(x[0]),
-                title=x[1],
-                description=x[2],
-                upload_timestamp=int(x[3]),
-                duration=int(x[4]),
-                epoch=int(x[5]),
-                channel_id=ChannelUUID(x[6]),
-                channel_handle=ChannelHandle(x[8]),
-                channel_name=x[7]
-            ) for x in self._exec('''
-                SELECT
-                    Video.id, Video.title, Video.description,
-                    Video.upload_timestamp, Video.duration, Video.epoch,
-                    Channel.id,Channel.title,Channel.handle
-                FROM Video
-                RIGHT JOIN Pointer ON Video.num_id=Pointer.video_id
-                INNER JOIN Channel ON Video.channel_id=Channel.num_id
-                WHERE Pointer.playlist_id=?
-                ORDER BY Pointer.position ASC
-            ''',(data[0][7],))],
-            channel_name=data[0][5],
+            epoch=data[0][3],
+            entries=[_video_row(None, row[7:]) for row in data if row[7] is not None],
             channel_id=ChannelUUID(data[0][4]),
-            channel_handle=ChannelHandle(data[0][6])
+            channel_handle=ChannelHandle(data[0][5]),
+            channel_name=data[0][6]
         )
     def write_playlist_info(self, playlist: PlaylistMetadata[list[VideoID]]) -> PlaylistNumID:
-        db_out = self._exec(
-            '''INSERT INTO Playlist(id,title,description,epoch,count,channel_id)
-            VALUES (?,?,?,?,?,(SELECT num_id FROM Channel WHERE id=?))
-            ON CONFLICT DO UPDATE SET  
-                title=excluded.title,
-                description=excluded.description,
-                epoch=excluded.epoch,
-                count=excluded.count,
-                channel_id=excluded.channel_id
-            RETURNING (num_id)''',
-            (
-                playlist.id, playlist.title, playlist.description, int(playlist.epoch),
-                playlist.entry_count, playlist.channel_id
-            )
-        )
-        pnumid = self._exec("SELECT num_id FROM Playlist WHERE id=?",(playlist.id,))[0][0]
-        self._exec("DELETE FROM Pointer WHERE playlist_id=?",(pnumid,))
-        for x in enumerate(playlist.entries):
-            self._exec(
-                '''INSERT INTO Pointer(playlist_id, video_id, position)
-                VALUES (?,(SELECT num_id FROM Video WHERE id=?),?)''',(pnumid,x[1],x[0])
-            ) 
-        self._exec(
-            "INSERT OR REPLACE INTO TaggedPlaylist(tag_id,playlist_id) VALUES (0,?)",
-            (pnumid,)
+        db_out = self._exec(_SQL_WRITE_PLAYLIST_INFO, (
+            playlist.id, playlist.title, playlist.description, int(playlist.epoch),
+            playlist.entry_count, self.get_cnumid(playlist.channel_id)
+        ))
+        pnumid = db_out[0][0]
+        vnumids = self.get_vnumids(playlist.entries)
+        self._exec(_SQL_TRIM_POINTERS, (pnumid, json.dumps(list(vnumids.values()))))
+        self._exec_many(
+            _SQL_UPSERT_POINTER,
+            [
+                (pnumid, vnumids[vid], pos)
+                for pos, vid in enumerate(playlist.entries) if vid in vnumids
+            ]
         )
-        self.connection.commit()
-        return PlaylistNumID(db_out[0][0])
+        self._exec(_SQL_TAG_PLAYLIST_DEFAULT, (pnumid,))
+        _lru_put(self._pnumid_cache, playlist.id.value, PlaylistNumID(pnumid))
+        self._commit()
+        return PlaylistNumID(pnumid)
 
     def get_channel_info(self, cid: ChannelUUID | ChannelHandle) -> ChannelMetadata | None:
         match cid:
             case ChannelUUID():
-                data = self._exec('''
-                SELECT
-                    id, handle, title, description, epoch
-                FROM Channel
-                WHERE id=?
-                ''',(cid,))
-                if len(data) == 0:
+                data = self._exec_one(_SQL_GET_CHANNEL_BY_ID, (cid,))
+                if data is None:
                     return None
                 return ChannelMetadata(
-                    id=ChannelUUID(data[0][0]),
-                    handle=ChannelHandle(data[0][1]),
-                    title=data[0][2],
-                    description=data[0][3],
-                    epoch=int(data[0][4])
+                    id=ChannelUUID(data[0]),
+                    handle=ChannelHandle(data[1]),
+                    title=data[2],
+                    description=data[3],
+                    epoch=data[4]
                 )
             case ChannelHandle():
-                data = self._exec('''
-                SELECT
-                    id, handle, title, description, epoch
-                FROM Channel
-                WHERE handle=?
-                ''',(cid,))
-                if len(data) == 0:
+                data = self._exec_one(_SQL_GET_CHANNEL_BY_HANDLE, (cid,))
+                if data is None:
                     return None
                 return ChannelMetadata(
-                    id=ChannelUUID(data[0][0]),
-                    handle=ChannelHandle(data[0][1]),
-                    title=data[0][2],
-                    description=data[0][3],
-                    epoch=int(data[0][4])
+                    id=ChannelUUID(data[0]),
+                    handle=ChannelHandle(data[1]),
+                    title=data[2],
+                    description=data[3],
+                    epoch=data[4]
                 )
-    def write_channel_info(self, channel: ChannelMetadata) -> None:
-        self._exec(
-            '''INSERT INTO Channel(id,handle,title,description,epoch) VALUES (?,?,?,?,?)
-            ON CONFLICT DO UPDATE SET  
-                handle=excluded.handle,
-                title=excluded.title,
-                description=excluded.description,
-                epoch=excluded.epoch''',
+    def write_channel_info(self, channel: ChannelMetadata) -> ChannelNumID | None:
+        db_out = self._exec(
+            _SQL_WRITE_CHANNEL_INFO,
             (channel.id, channel.handle, channel.title, channel.description, int(channel.epoch))
         )
-        self.connection.commit()
+        self._cnumid_cache.pop(str(channel.id), None)
+        self._commit()
+        # A handle conflict updates another channel's row
+        if db_out[0][1] != str(channel.id):
+            return None
+        return ChannelNumID(db_out[0][0])
 
     def get_videos(self, tnumid: list[TagNumID | None]) -> list[VideoMetadata]:
-        return [VideoMetadata(
-            id=VideoID(data[0]),
-            title=data[1],
-            description=data[2],
-            upload_timestamp=int(data[3]),
-            duration=int(data[4]),
-            epoch=data[5],
-            channel_id=ChannelUUID(data[6]),
-            channel_handle=ChannelHandle(data[8]),
-            channel_name=data[7]
-        ) for data in self._exec(f'''
-            SELECT
-                Video.id, Video.title, Video.description, Video.upload_timestamp,
-                Video.duration, Video.epoch, Channel.id, Channel.title, Channel.handle
-            FROM Video
-            INNER JOIN Channel ON Video.channel_id=Channel.num_id
-            {f'''JOIN (
-                SELECT video_id
-                FROM TaggedVideo
-                WHERE tag_id IN ({",".join([str(x) for x in tnumid if isinstance(x,TagNumID)])})
-                GROUP BY video_id
-                HAVING COUNT(DISTINCT tag_id) = {len(tnumid)}
-            ) AS tagged ON Video.num_id = tagged.video_id;''' if len(tnumid) > 0 else ""}
-        ''')]
+        if None in tnumid:
+            return []
+        if len(tnumid) > 0:
+            return self._exec_rows(_SQL_GET_VIDEOS_TAGGED, _tag_filter_params(tnumid), _video_row)
+        return self._exec_rows(_SQL_GET_VIDEOS, None, _video_row)
+    def get_video_table(self, tnumid: list[TagNumID | None]) -> VideoTable:
+        table = VideoTable()
+        if None in tnumid:
+            return table
+        if len(tnumid) > 0:
+            table.extend_rows(self._exec(_SQL_GET_VIDEOS_TAGGED, _tag_filter_params(tnumid)))
+        else:
+            table.extend_rows(self._exec(_SQL_GET_VIDEOS))
+        return table
     def get_playlists(self, tnumid: list[TagNumID | None]) -> list[PlaylistMetadata[int]]:
-        return [PlaylistMetadata[int](
-            id=PlaylistID(playlist[0]),
-            title=playlist[1],
-            description=playlist[2],
-            epoch=int(playlist[4]),
-            channel_id=ChannelUUID(playlist[5]),
-            entries=int(playlist[3]),
-            channel_name=playlist[6],
-            channel_handle=ChannelHandle(playlist[7])
-        ) for playlist in self._exec(f'''
-            SELECT
-                Playlist.id, Playlist.title, Playlist.description,
-                Playlist.count, Playlist.epoch,
-                Channel.id, Channel.title, Channel.handle
-            FROM Playlist
-            INNER JOIN Channel ON Playlist.channel_id=Channel.num_id
-            {f'''JOIN (
-                SELECT playlist_id
-                FROM TaggedPlaylist
-                WHERE tag_id IN ({",".join([str(x) for x in tnumid if isinstance(x,TagNumID)])})
-                GROUP BY playlist_id
-                HAVING COUNT(DISTINCT tag_id) = {len(tnumid)}
-            ) AS tagged ON Playlist.num_id = tagged.playlist_id;''' if len(tnumid) > 0 else ""}
-        ''')]
+        if None in tnumid:
+            return []
+        if len(tnumid) > 0:
+            return self._exec_rows(
+                _SQL_GET_PLAYLISTS_TAGGED, _tag_filter_params(tnumid), _playlist_row
+            )
+        return self._exec_rows(_SQL_GET_PLAYLISTS, None, _playlist_row)
 
     def get_video_playlists(self, vid: VideoID) -> list[tuple[PlaylistNumID,int]]:
-        return [
-            (PlaylistNumID(a),b) for a,b in
-            self._exec(
-                "SELECT playlist_id, position FROM Pointer WHERE video_id = ?",
-                (self.get_vnumid(vid),)
-            )
-        ]
+        return cast(
+            list[tuple[PlaylistNumID,int]],
+            self._exec(_SQL_GET_VIDEO_PLAYLISTS, (vid,))
+        )
 
     def get_videos_from_channel(self, cid: ChannelUUID) -> list[VideoMetadata]:
-        return [VideoMetadata(
-            id=VideoID(data[0]),
-            title=data[1],
-            description=data[2],
-            upload_timestamp=int(data[3]),
-            duration=int(data[4]),
-            epoch=data[5],
-            channel_id=ChannelUUID(data[6]),
-            channel_handle=ChannelHandle(data[8]),
-            channel_name=data[7]
-        ) for data in self._exec('''
-            SELECT
-                Video.id, Video.title, Video.description,
-                Video.upload_timestamp, Video.duration, Video.epoch,
-                Channel.id, Channel.title, Channel.handle
-            FROM Video
-            INNER JOIN Channel ON Video.channel_id=Channel.num_id
-            WHERE Video.channel_id=(SELECT num_id FROM Channel WHERE id=?)
-        ''',(cid,))]
+        return self._exec_rows(_SQL_GET_VIDEOS_FROM_CHANNEL, (cid,), _video_row)
     def get_playlists_from_channel(self, cid: ChannelUUID) -> list[PlaylistMetadata[int]]:
-        return [PlaylistMetadata[int](
-            id=PlaylistID(playlist[0]),
-            title=playlist[1],
-            description=playlist[2],
-            epoch=int(playlist[4]),
-            channel_id=ChannelUUID(playlist[5]),
-            channel_handle=ChannelHandle(playlist[7]),
-            entries=int(playlist[3]),
-            channel_name=playlist[6]
-        ) for playlist in self._exec('''
-            SELECT
-                Playlist.id, Playlist.title, Playlist.description,
-                Playlist.count, Playlist.epoch,
-                Channel.id, Channel.title, Channel.handle
-            FROM Playlist
-            INNER JOIN Channel ON Playlist.channel_id=Channel.num_id
-            WHERE Playlist.channel_id=(SELECT num_id FROM Channel WHERE id=?)
-        ''',(cid,))]
+        return self._exec_rows(_SQL_GET_PLAYLISTS_FROM_CHANNEL, (cid,), _playlist_row)
 
     def get_vnumid(self, vid: VideoID | None) -> VideoNumID | None:
         if vid is None:
             return None
-        data = self._exec("SELECT num_id FROM Video WHERE id=?",(vid,))
-        if len(data)==0:
+        vnumid = self._vnumid_cache.get(vid.value)
+        if vnumid is not None:
+            self._vnumid_cache.move_to_end(vid.value)
+            return vnumid
+        data = self._exec_one(_SQL_GET_VNUMID, (vid,))
+        if data is None:
             return None
-        return VideoNumID(data[0][0])
+        vnumid = VideoNumID(data[0])
+        _lru_put(self._vnumid_cache, vid.value, vnumid)
+        return vnumid
+    def get_vnumids(self, vids: list[VideoID]) -> dict[VideoID, VideoNumID]:
+        by_value = {vid.value: vid for vid in vids}
+        return {
+            by_value[row[0]]: VideoNumID(row[1]) for row in
+            self._exec(_SQL_GET_VNUMIDS, (json.dumps(list(by_value)),))
+        }
     def get_pnumid(self, pid: PlaylistID) -> PlaylistNumID | None:
-        data = self._exec("SELECT num_id FROM Playlist WHERE id=?",(pid,))
-        if len(data) == 0:
+        pnumid = self._pnumid_cache.get(pid.value)
+        if pnumid is not None:
+            self._pnumid_cache.move_to_end(pid.value)
+            return pnumid
+        data = self._exec_one(_SQL_GET_PNUMID, (pid,))
+        if data is None:
+            return None
+        pnumid = PlaylistNumID(data[0])
+        _lru_put(self._pnumid_cache, pid.value, pnumid)
+        return pnumid
+    def get_cnumid(self, cid: ChannelUUID) -> ChannelNumID | None:
+        cnumid = self._cnumid_cache.get(cid.value)
+        if cnumid is not None:
+            self._cnumid_cache.move_to_end(cid.value)
+            return cnumid
+        data = self._exec_one(_SQL_GET_CNUMID, (cid,))
+        if data is None:
             return None
-        return PlaylistNumID(data[0][0])
+        cnumid = ChannelNumID(data[0])
+        _lru_put(self._cnumid_cache, cid.value, cnumid)
+        return cnumid
     def get_tnumid(self, tid: TagID) -> TagNumID | None:
-        output = self._exec("SELECT num_id FROM Tag WHERE id=?",(tid,))
-        if len(output) == 0:
+        tnumid = self._tnumid_cache.get(tid.value)
+        if tnumid is not None:
+            self._tnumid_cache.move_to_end(tid.value)
+            return tnumid
+        output = self._exec_one(_SQL_GET_TNUMID, (tid,))
+        if output is None:
             return None
-        return TagNumID(output[0][0])
+        tnumid = TagNumID(output[0])
+        _lru_put(self._tnumid_cache, tid.value, tnumid)
+        return tnumid
 
     def create_tag(self, tid: TagID, description: str) -> TagNumID:
-        db_out = self._exec(
-            "INSERT INTO Tag(id,description) VALUES (?,?) RETURNING (num_id)",(
-            tid,description))
-        self.connection.commit()
-        return TagNumID(db_out[0][0])
+        db_out = self._exec(_SQL_CREATE_TAG, (tid, description))
+        tnumid = TagNumID(db_out[0][0])
+        _lru_put(self._tnumid_cache, tid.value, tnumid)
+        self._commit()
+        return tnumid
     def delete_tag(self, tid: TagID) ->  None:
-        self._exec("DELETE FROM Tag WHERE id=?",(tid,))
-        self.connection.commit()
+        self._exec(_SQL_DELETE_TAG, (tid,))
+        self._tnumid_cache.pop(tid.value, None)
+        self._commit()
     def get_tag_info(self, tid: TagID) -> TagMetadata | None:
-        output = self._exec("SELECT num_id,id,long_name FROM Tag WHERE id=?",(tid,))
-        if len(output) == 0:
+        output = self._exec_one(_SQL_GET_TAG_INFO, (tid,))
+        if output is None:
             return None
         return TagMetadata(
-            num_id=TagNumID(output[0][0]),
-            id=TagID(output[0][1]),
-            long_name=output[0][2]
+            num_id=TagNumID(output[0]),
+            id=TagID(output[1]),
+            long_name=output[2]
         )
     def add_tag(self, tid: TagID, item: VideoID | PlaylistID) -> bool:
         tnumid = self.get_tnumid(tid)
@@ -486,43 +701,46 @@ class Database:
                 vnumid = self.get_vnumid(item)
                 if tnumid is None or vnumid is None:
                     return False
-                self._exec(
-                    "INSERT OR REPLACE INTO TaggedVideo(tag_id,video_id) VALUES (?,?)",
-                    (tnumid, vnumid))
-                self.connection.commit()
+                self._exec(_SQL_TAG_VIDEO, (tnumid, vnumid))
+                self._commit()
                 return True
             case PlaylistID():
                 pnumid = self.get_pnumid(item)
                 if tnumid is None or pnumid is None:
                     return False
-                self._exec(
-                    "INSERT OR REPLACE INTO TaggedPlaylist(tag_id,playlist_id) VALUES (?,?)",
-                    (tnumid,pnumid))
-                self.connection.commit()
+                self._exec(_SQL_TAG_PLAYLIST, (tnumid, pnumid))
+                self._commit()
                 return True
+    def add_tags(self, tid: TagID, items: list[VideoID | PlaylistID]) -> int:
+        tnumid = self.get_tnumid(tid)
+        if tnumid is None:
+            return 0
+        vnumids = self.get_vnumids([x for x in items if isinstance(x, VideoID)])
+        pnumids = [
+            pnumid for pnumid in
+            (self.get_pnumid(x) for x in items if isinstance(x, PlaylistID))
+            if pnumid is not None
+        ]
+        self._exec_many(_SQL_TAG_VIDEO, [(tnumid, vnumid) for vnumid in vnumids.values()])
+        self._exec_many(_SQL_TAG_PLAYLIST, [(tnumid, pnumid) for pnumid in pnumids])
+        self._commit()
+        return len(vnumids) + len(pnumids)
     def get_tags(self, item: VideoID | PlaylistID) -> list[TagNumID]:
         match item:
             case VideoID():
-                return [
-                    TagNumID(x[0]) for x in
-                    self._exec(
-                        "SELECT tag_id FROM TaggedVideo WHERE video_id = ?",
-                        (self.get_vnumid(item),)
-                    )
-                ]
+                return self._exec_rows(_SQL_GET_VIDEO_TAGS, (item,), _first_column)
             case PlaylistID():
-                return [
-                    TagNumID(x[0]) for x in
-                    self._exec(
-                        "SELECT tag_id FROM TaggedPlaylist WHERE playlist_id = ?",
-                        (self.get_pnumid(item),)
-                    )
-                ]
+                return self._exec_rows(_SQL_GET_PLAYLIST_TAGS, (item,), _first_column)
 
     def remove_video(self, vid: VideoID) -> None:
-        self._exec("DELETE FROM Video WHERE id=?", (vid,))
-        self.connection.commit()
+        self._exec(_SQL_REMOVE_VIDEO, (vid,))
+        self._vnumid_cache.pop(vid.value, None)
+        self._commit()
+
+    def integrity_check(self) -> list[str]:
+        return self._exec_rows("PRAGMA integrity_check", None, _first_column)
 
     def exit(self) -> None:
         self.connection.commit()
+        self._exec("PRAGMA optimize")
         self.connection.close()
@@ -231,6 +231,11 @@ class Library:
         return cached_videos
 
     def integrity_check(self) -> None:
+        db_check = self.db.integrity_check()
+        if db_check != ['ok']:
+            print("Database integrity check failed:")
+            for line in db_check:
+                print(line)
         cached_videos = self._get_cached_content()
         database_videos: list[VideoID] = [x.id for x in self.get_all_videos()]
         print(self.media_fs)
@@ -299,6 +299,12 @@ def main() -> None:
         try_copy(f"{db_path}.bak2", f"{db_path}.bak")
         print(f"Error loading database!\n{e}\nAttempting to revert to backup")
         shutil.copy(db_path, f"{db_path}.err")
+        # A leftover WAL belongs to the corrupted file and must not be replayed onto the backup
+        for suffix in ("-wal", "-shm"):
+            try:
+                os.replace(f"{db_path}{suffix}", f"{db_path}.err{suffix}")
+            except FileNotFoundError:
+                pass
         if not try_copy(f"{db_path}.bak", db_path):
             print("Sorry, no backup could be found")
             return
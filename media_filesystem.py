@@ -42,11 +42,11 @@ class MediaFilesystem:
 
 class LocalFilesystem(MediaFilesystem):
     def _foldername(self, vid: VideoID) -> str:
-        return f"{self.path}/{ord(vid.value[0])-32}/{ord(vid.value[1])-32}"
+        return f"{self.path}/{vid.foldername}"
     def _filename(self, vid: VideoID) -> str:
         return f"{self._foldername(vid)}/{vid.value}.mkv"
     def _thumbnail_foldername(self, vid: VideoID) -> str:
-        return f"{self.path}/thumbs/{ord(vid.value[0])-32}/{ord(vid.value[1])-32}"
+        return f"{self.path}/thumbs/{vid.foldername}"
     def _thumbnail_filename(self, vid: VideoID) -> str:
         return f"{self._thumbnail_foldername(vid)}/{vid.value}.jpg"
 
@@ -123,11 +123,11 @@ class LocalFilesystem(MediaFilesystem):
 
 class AWSFilesystem(MediaFilesystem):
     def _foldername(self, vid: VideoID) -> str:
-        return f"{self.path}/{ord(vid.value[0])-32}/{ord(vid.value[1])-32}"
+        return f"{self.path}/{vid.foldername}"
     def _filename(self, vid: VideoID) -> str:
         return f"{self._foldername(vid)}/{vid.value}.mkv"
     def _thumbnail_foldername(self, vid: VideoID) -> str:
-        return f"{self.path}/thumbs/{ord(vid.value[0])-32}/{ord(vid.value[1])-32}"
+        return f"{self.path}/thumbs/{vid.foldername}"
     def _thumbnail_filename(self, vid: VideoID) -> str:
         return f"{self._thumbnail_foldername(vid)}/{vid.value}.jpg"
     def _aws_filename(self, vid: VideoID) -> str: